@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+A module for calibrating the bcrypt cost factor to a latency budget.
+
+Usage: python3 bcrypt_cost.py [--budget-ms MS] [--percentile P]
+"""
+import argparse
+import json
+import math
+import os
+import time
+from datetime import datetime
+from typing import List
+
+import bcrypt
+
+
+DEFAULT_COST = 12
+MIN_COST = 4
+MAX_COST = 20
+COST_FILE = os.getenv("BCRYPT_COST_FILE", ".bcrypt_cost.json")
+
+_costs = {}
+
+
+def measure_cost(cost: int, samples: int = 10) -> List[float]:
+    """
+    Time bcrypt hashing at a given cost factor.
+
+    Args:
+        cost (int): The bcrypt cost factor (log2 of the rounds).
+        samples (int): Number of hashes to time.
+
+    Returns:
+        List[float]: The duration of each hash, in milliseconds.
+    """
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", bcrypt.gensalt(rounds=cost))
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return timings
+
+
+def percentile(values: List[float], rank: float) -> float:
+    """
+    Return the nearest-rank percentile of a list of values.
+
+    Args:
+        values (List[float]): The measured values.
+        rank (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The value at that percentile.
+    """
+    ordered = sorted(values)
+    index = max(0, math.ceil(rank / 100.0 * len(ordered)) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def calibrate(budget_ms: float = 100.0, rank: float = 99.0,
+              samples: int = 10, max_cost: int = MAX_COST) -> int:
+    """
+    Find the highest cost factor that hashes within a latency budget.
+
+    Costs are tried upwards from the bcrypt minimum. Each step doubles
+    the work, so a cost is not even measured when twice the previous
+    percentile is clearly over budget.
+
+    Args:
+        budget_ms (float): Latency budget of one hash, in milliseconds.
+        rank (float): Percentile of the timings held to the budget.
+        samples (int): Number of hashes timed per cost factor.
+        max_cost (int): Highest cost factor to consider.
+
+    Returns:
+        int: The chosen cost factor, at least MIN_COST.
+    """
+    best = MIN_COST
+    for cost in range(MIN_COST, max_cost + 1):
+        latency = percentile(measure_cost(cost, samples), rank)
+        if latency > budget_ms:
+            break
+        best = cost
+        if latency * 2 > budget_ms * 1.25:
+            break
+    return best
+
+
+def save_cost(cost: int, path: str = COST_FILE, **details: dict) -> None:
+    """
+    Persist a cost factor so every hashing path picks it up.
+
+    Args:
+        cost (int): The cost factor to store.
+        path (str): Path of the settings file.
+        **details: Extra calibration details stored alongside.
+    """
+    setting = dict(details, cost=cost,
+                   calibrated_at=datetime.utcnow().isoformat())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(setting, f)
+    os.replace(tmp_path, path)
+    _costs.pop(path, None)
+
+
+def get_cost(path: str = COST_FILE) -> int:
+    """
+    Return the cost factor new hashes should use.
+
+    The `BCRYPT_COST` environment variable wins, then the calibrated
+    setting file, then the bcrypt library default.
+
+    Args:
+        path (str): Path of the settings file.
+
+    Returns:
+        int: The cost factor.
+    """
+    if path not in _costs:
+        cost = os.getenv("BCRYPT_COST")
+        if cost is None and os.path.exists(path):
+            with open(path, "r") as f:
+                cost = json.load(f).get("cost")
+        _costs[path] = int(cost) if cost is not None else DEFAULT_COST
+    return _costs[path]
+
+
+def main() -> None:
+    """
+    Calibrate the cost factor on this machine and store it.
+    """
+    parser = argparse.ArgumentParser(
+        prog="bcrypt_cost",
+        description="Pick the bcrypt cost that fits a latency budget.")
+    parser.add_argument("--budget-ms", type=float, default=100.0,
+                        help="latency budget of one hash")
+    parser.add_argument("--percentile", type=float, default=99.0,
+                        help="percentile held to the budget")
+    parser.add_argument("--samples", type=int, default=10,
+                        help="hashes timed per cost factor")
+    parser.add_argument("--output", default=COST_FILE,
+                        help="settings file to write")
+    args = parser.parse_args()
+
+    cost = calibrate(args.budget_ms, args.percentile, args.samples)
+    save_cost(cost, args.output, budget_ms=args.budget_ms,
+              percentile=args.percentile)
+    print("bcrypt cost {} (p{:g} <= {:g} ms)".format(
+        cost, args.percentile, args.budget_ms))
+
+
+if __name__ == "__main__":
+    main()
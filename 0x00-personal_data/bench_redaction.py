@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the redaction hot paths of filtered_logger.
+
+Usage: python3 bench_redaction.py [--lines N] [--output FILE]
+                                  [--baseline FILE] [--tolerance PCT]
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Sequence
+
+from filtered_logger import (
+    PII_FIELDS, PIIScanner, RedactingFormatter, filter_datum, get_logger
+)
+from stream_redactor import ColumnRedactor
+
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "user_data.csv")
+NO_PII_LINES = (
+    "GET /api/v1/status 200 in 3ms",
+    "worker 4 started, 12 jobs queued",
+    "cache miss ratio=0.13 over the last 60s",
+)
+
+
+def load_rows(path: str = CSV_PATH) -> List[Dict[str, str]]:
+    """
+    Read the sample user rows used to shape synthetic log lines.
+
+    Args:
+        path (str): Path of the CSV file with a header row.
+
+    Returns:
+        List[Dict[str, str]]: The rows, keyed by column name.
+    """
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def make_lines(rows: List[Dict[str, str]], count: int, pii_ratio: float,
+               seed: int = 0) -> List[str]:
+    """
+    Generate `key=value;` log lines shaped like the sample rows.
+
+    Lines carry a random subset of the columns (so the number of PII
+    fields and the message length vary) or, with probability
+    `1 - pii_ratio`, are free text with no PII at all.
+
+    Args:
+        rows (List[Dict[str, str]]): Sample rows to draw values from.
+        count (int): Number of lines to generate.
+        pii_ratio (float): Fraction of lines built from row fields.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        List[str]: The generated lines.
+    """
+    rng = random.Random(seed)
+    columns = list(rows[0].keys())
+    lines = []
+    for _ in range(count):
+        if rng.random() >= pii_ratio:
+            lines.append(rng.choice(NO_PII_LINES))
+            continue
+        row = rng.choice(rows)
+        picked = rng.sample(columns, rng.randint(1, len(columns)))
+        lines.append("".join(f"{column}={row[column]};"
+                             for column in picked))
+    return lines
+
+
+def make_free_text(rows: List[Dict[str, str]], count: int,
+                   pii_ratio: float, seed: int = 0) -> List[str]:
+    """
+    Generate free-form log sentences, some mentioning PII values.
+
+    Args:
+        rows (List[Dict[str, str]]): Sample rows to draw values from.
+        count (int): Number of lines to generate.
+        pii_ratio (float): Fraction of lines mentioning a PII value.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        List[str]: The generated lines.
+    """
+    rng = random.Random(seed)
+    templates = (
+        "password reset requested by {email} from {ip}",
+        "support call from {phone} about account {ssn}",
+        "login ok for {name} using {user_agent}",
+    )
+    lines = []
+    for _ in range(count):
+        if rng.random() >= pii_ratio:
+            lines.append(rng.choice(NO_PII_LINES))
+        else:
+            lines.append(rng.choice(templates).format(**rng.choice(rows)))
+    return lines
+
+
+def measure(func: Callable[[object], object], items: Sequence,
+            alloc_sample: int = 1000) -> Dict[str, float]:
+    """
+    Measure the throughput and memory use of a per-item function.
+
+    Throughput is timed without tracing; allocations are traced with
+    tracemalloc over the first `alloc_sample` items only.
+
+    Args:
+        func (Callable[[object], object]): Function applied to each item.
+        items (Sequence): The inputs.
+        alloc_sample (int): Number of items traced for allocations.
+
+    Returns:
+        Dict[str, float]: lines_per_sec, and peak_traced_bytes, the
+                          highest memory held while tracing the sample.
+    """
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - started
+
+    sample = items[:alloc_sample]
+    tracemalloc.start()
+    try:
+        for item in sample:
+            func(item)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "lines_per_sec": len(items) / elapsed if elapsed else 0.0,
+        "peak_traced_bytes": peak,
+    }
+
+
+def make_records(lines: List[str]) -> List[logging.LogRecord]:
+    """
+    Wrap log lines into log records as a logger would.
+
+    Args:
+        lines (List[str]): The messages.
+
+    Returns:
+        List[logging.LogRecord]: One INFO record per line.
+    """
+    return [logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                              line, None, None) for line in lines]
+
+
+def run(line_count: int) -> Dict[str, Dict[str, float]]:
+    """
+    Run every benchmark case.
+
+    The `scanner/*` cases run the free-text PII scanner over sentences
+    of which half mention a PII value, and over text it can skip. The
+    `csv/*` cases redact user_data.csv rows either by column index
+    or by joining them into `key=value;` text for `filter_datum`.
+
+    Args:
+        line_count (int): Number of lines per case.
+
+    Returns:
+        Dict[str, Dict[str, float]]: The results keyed by case name.
+    """
+    rows = load_rows()
+    formatter = RedactingFormatter(PII_FIELDS)
+    log = get_logger()
+    sink = io.StringIO()
+    for handler in log.handlers:
+        handler.setStream(sink)
+
+    def log_line(line: str) -> None:
+        """Log one line and drop what the handler wrote."""
+        log.info(line)
+        sink.seek(0)
+        sink.truncate()
+
+    results = {}
+    for label, ratio in (("mixed", 0.8), ("all_pii", 1.0), ("no_pii", 0.0)):
+        lines = make_lines(rows, line_count, ratio)
+        records = make_records(lines)
+        results[f"filter_datum/{label}"] = measure(
+            lambda line: filter_datum(PII_FIELDS, formatter.REDACTION,
+                                      line, formatter.SEPARATOR), lines)
+        results[f"format/{label}"] = measure(formatter.format, records)
+        results[f"get_logger/{label}"] = measure(log_line, lines)
+
+    scanner = PIIScanner()
+    results["scanner/free_text"] = measure(
+        scanner.redact, make_free_text(rows, line_count, 0.5))
+    results["scanner/no_trigger"] = measure(
+        scanner.redact, ["cache warmed in 12 ms for 3 shards"] * line_count)
+
+    header = list(rows[0].keys())
+    table = [list(rows[i % len(rows)].values()) for i in range(line_count)]
+    redact_row = ColumnRedactor(header).redact_row
+    results["csv/columnar"] = measure(lambda row: redact_row(list(row)),
+                                      table)
+    results["csv/regex"] = measure(
+        lambda row: filter_datum(
+            PII_FIELDS, formatter.REDACTION,
+            "".join([f"{name}={value};"
+                     for name, value in zip(header, row)]),
+            formatter.SEPARATOR), table)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]],
+            baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """
+    List the cases whose throughput regressed against a baseline.
+
+    Args:
+        results (Dict[str, Dict[str, float]]): The current results.
+        baseline (Dict[str, Dict[str, float]]): The reference results.
+        tolerance (float): Allowed slowdown, in percent.
+
+    Returns:
+        List[str]: One description per regressed case.
+    """
+    regressions = []
+    for case, current in sorted(results.items()):
+        reference = baseline.get(case)
+        if not reference or not reference.get("lines_per_sec"):
+            continue
+        change = 100.0 * (current["lines_per_sec"]
+                          / reference["lines_per_sec"] - 1.0)
+        if change < -tolerance:
+            regressions.append("{}: {:.1f}% lines/sec".format(case, change))
+    return regressions
+
+
+def main(argv: Sequence[str] = None) -> None:
+    """
+    Run the benchmarks, print JSON results and check for regressions.
+
+    Exits with status 1 when a case is slower than the baseline by more
+    than the tolerance.
+
+    Args:
+        argv (Sequence[str]): Arguments to parse, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        prog="bench_redaction",
+        description="Benchmark filter_datum and RedactingFormatter.")
+    parser.add_argument("--lines", type=int, default=100000,
+                        help="lines per benchmark case")
+    parser.add_argument("--output", help="also write the JSON results here")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=10.0,
+                        help="allowed slowdown against the baseline, in %%")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(),
+        "lines": args.lines,
+        "results": run(args.lines),
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(report["results"], baseline, args.tolerance)
+        for regression in regressions:
+            print("regression: " + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
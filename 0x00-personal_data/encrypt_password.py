@@ -2,20 +2,34 @@
 """
 A module for securely encrypting and validating passwords using bcrypt.
 """
+import os
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Iterable, List
+
 import bcrypt
 
+from bcrypt_cost import get_cost
+
+_executor = None
+_executor_lock = threading.Lock()
+
 
 def hash_password(password: str) -> bytes:
     """
     Hash a password using bcrypt with a random salt.
 
+    The cost factor comes from `bcrypt_cost.get_cost`, so it follows
+    the calibrated setting instead of the library default.
+
     Args:
         password (str): The plain text password to be hashed.
 
     Returns:
         bytes: The hashed password as a byte string.
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode('utf-8'),
+                         bcrypt.gensalt(rounds=get_cost()))
 
 
 def is_valid(hashed_password: bytes, password: str) -> bool:
@@ -30,3 +44,122 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         bool: True if the password matches the hash, False otherwise.
     """
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def configure_pool(max_workers: int = None) -> None:
+    """
+    Replace the shared thread pool used by the batch functions.
+
+    bcrypt releases the GIL while hashing, so one thread per core keeps
+    every core busy.
+
+    Args:
+        max_workers (int): Number of hashing threads, defaults to the
+                           number of CPUs.
+    """
+    global _executor
+    with _executor_lock:
+        old, _executor = _executor, ThreadPoolExecutor(
+            max_workers or os.cpu_count() or 1,
+            thread_name_prefix="bcrypt")
+    if old is not None:
+        old.shutdown(wait=True)
+
+
+def _get_executor() -> Executor:
+    """
+    Return the shared thread pool, creating it on first use.
+
+    Returns:
+        Executor: The shared thread pool.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    os.cpu_count() or 1, thread_name_prefix="bcrypt")
+    return _executor
+
+
+def hash_password_many_async(passwords: Iterable[str],
+                             executor: Executor = None) -> List[Future]:
+    """
+    Start hashing a batch of passwords in the thread pool.
+
+    Args:
+        passwords (Iterable[str]): The plain text passwords.
+        executor (Executor): Pool to use instead of the shared one.
+
+    Returns:
+        List[Future]: One future per password, resolving to its hash.
+    """
+    executor = executor or _get_executor()
+    return [executor.submit(hash_password, password)
+            for password in passwords]
+
+
+def hash_password_many(passwords: Iterable[str],
+                       executor: Executor = None) -> List[bytes]:
+    """
+    Hash a batch of passwords in parallel.
+
+    Args:
+        passwords (Iterable[str]): The plain text passwords.
+        executor (Executor): Pool to use instead of the shared one.
+
+    Returns:
+        List[bytes]: The hashed passwords, in input order.
+    """
+    futures = hash_password_many_async(passwords, executor)
+    return [future.result() for future in futures]
+
+
+def is_valid_many_async(hashed_passwords: Iterable[bytes],
+                        passwords: Iterable[str],
+                        executor: Executor = None) -> List[Future]:
+    """
+    Start checking a batch of passwords against their hashes.
+
+    Args:
+        hashed_passwords (Iterable[bytes]): The previously hashed passwords.
+        passwords (Iterable[str]): The plain text passwords, in the same
+                                   order as the hashes.
+        executor (Executor): Pool to use instead of the shared one.
+
+    Returns:
+        List[Future]: One future per pair, resolving to the check result.
+
+    Raises:
+        ValueError: If there are not as many passwords as hashes.
+    """
+    hashed_passwords = list(hashed_passwords)
+    passwords = list(passwords)
+    if len(hashed_passwords) != len(passwords):
+        raise ValueError("got {} hashes for {} passwords".format(
+            len(hashed_passwords), len(passwords)))
+    executor = executor or _get_executor()
+    return [executor.submit(is_valid, hashed, password)
+            for hashed, password in zip(hashed_passwords, passwords)]
+
+
+def is_valid_many(hashed_passwords: Iterable[bytes],
+                  passwords: Iterable[str],
+                  executor: Executor = None) -> List[bool]:
+    """
+    Check a batch of passwords against their hashes in parallel.
+
+    Args:
+        hashed_passwords (Iterable[bytes]): The previously hashed passwords.
+        passwords (Iterable[str]): The plain text passwords, in the same
+                                   order as the hashes.
+        executor (Executor): Pool to use instead of the shared one.
+
+    Returns:
+        List[bool]: For each pair, True if the password matches the hash.
+
+    Raises:
+        ValueError: If there are not as many passwords as hashes.
+    """
+    futures = is_valid_many_async(hashed_passwords, passwords, executor)
+    return [future.result() for future in futures]
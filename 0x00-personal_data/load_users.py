@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Module for bulk loading user CSV data into the personal data database.
+
+Usage: python3 load_users.py [--batch-size N] [--hash-passwords] CSV
+"""
+
+import argparse
+import csv
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Sequence
+
+import mysql.connector
+
+from encrypt_password import hash_password_many
+from filtered_logger import get_db
+
+
+DEFAULT_BATCH_SIZE = 5000
+IDENTIFIER = re.compile(r"\w+")
+
+
+def iter_batches(rows: Iterator[List[str]],
+                 batch_size: int) -> Iterator[List[List[str]]]:
+    """
+    Group an iterator of rows into lists of at most `batch_size` rows.
+
+    Args:
+        rows (Iterator[List[str]]): The rows to group.
+        batch_size (int): Maximum number of rows per batch.
+
+    Yields:
+        List[List[str]]: The next batch of rows.
+    """
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_statement(table: str, columns: Sequence[str]) -> str:
+    """
+    Build the parameterized INSERT statement for a CSV header.
+
+    Args:
+        table (str): Name of the destination table.
+        columns (Sequence[str]): Column names taken from the CSV header.
+
+    Returns:
+        str: The INSERT statement.
+
+    Raises:
+        ValueError: If a table or column name is not a plain identifier.
+    """
+    for name in (table, *columns):
+        if not IDENTIFIER.fullmatch(name):
+            raise ValueError("invalid identifier: {!r}".format(name))
+    return "INSERT INTO `{}` ({}) VALUES ({})".format(
+        table, ", ".join("`{}`".format(column) for column in columns),
+        ", ".join(["%s"] * len(columns)))
+
+
+def load_users(db: mysql.connector.connection.MySQLConnection,
+               csv_path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+               hash_passwords: bool = False, hash_workers: int = None,
+               table: str = "users") -> int:
+    """
+    Stream a CSV file into a table with one transaction per batch.
+
+    The file is read lazily and each batch is sent with a single
+    `executemany` call, which the connector turns into a multi-row
+    INSERT, then committed. When `hash_passwords` is set, the
+    `password` column of each batch is hashed with
+    `encrypt_password.hash_password_many` first.
+
+    Args:
+        db (MySQLConnection): Connection to the personal data database.
+        csv_path (str): Path of the CSV file, with a header row.
+        batch_size (int): Number of rows per INSERT and transaction.
+        hash_passwords (bool): If True, store bcrypt hashes of passwords.
+        hash_workers (int): Threads used to hash, defaults to the
+                            shared pool of encrypt_password.
+        table (str): Name of the destination table.
+
+    Returns:
+        int: The number of inserted rows.
+    """
+    count = 0
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader, None)
+        if not columns:
+            return 0
+        statement = insert_statement(table, columns)
+        password_index = columns.index("password") \
+            if hash_passwords and "password" in columns else None
+        pool = ThreadPoolExecutor(hash_workers) \
+            if password_index is not None and hash_workers else None
+        cursor = db.cursor()
+        try:
+            for batch in iter_batches(reader, batch_size):
+                if password_index is not None:
+                    hashes = hash_password_many(
+                        [row[password_index] for row in batch], pool)
+                    for row, hashed in zip(batch, hashes):
+                        row[password_index] = hashed.decode("utf-8")
+                try:
+                    cursor.executemany(statement, batch)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+                count += len(batch)
+        finally:
+            cursor.close()
+            if pool is not None:
+                pool.shutdown()
+    return count
+
+
+def main(argv: Sequence[str] = None) -> None:
+    """
+    Load a CSV file into the users table and report throughput.
+
+    Args:
+        argv (Sequence[str]): Arguments to parse, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        prog="load_users", description="Bulk load users from a CSV file.")
+    parser.add_argument("csv", help="CSV file with a header row")
+    parser.add_argument("--batch-size", type=int,
+                        default=DEFAULT_BATCH_SIZE,
+                        help="rows per INSERT and transaction")
+    parser.add_argument("--hash-passwords", action="store_true",
+                        help="store bcrypt hashes of the password column")
+    parser.add_argument("--hash-workers", type=int, default=None,
+                        help="threads used to hash passwords")
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    started = time.perf_counter()
+    try:
+        count = load_users(db, args.csv, args.batch_size,
+                           args.hash_passwords, args.hash_workers)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0.0
+    print("loaded {} rows in {:.2f}s ({:.0f} rows/s)".format(
+        count, elapsed, rate), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
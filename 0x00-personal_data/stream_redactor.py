@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Module for redacting large log files offline with bounded memory.
+
+Usage: python3 -m stream_redactor [--workers N | --csv] INPUT [OUTPUT]
+"""
+
+import argparse
+import csv
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    BinaryIO, Dict, Iterator, List, Sequence, TextIO, Tuple
+)
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, Redactor
+
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+RANGES_PER_WORKER = 4
+
+RangeStats = namedtuple("RangeStats", ["pid", "path", "start", "end",
+                                       "seconds"])
+_worker_redactor = None
+_worker_chunk_size = DEFAULT_CHUNK_SIZE
+
+
+def line_ranges(
+    buffer: mmap.mmap, start: int, end: int, chunk_size: int
+) -> Iterator[Tuple[int, int]]:
+    """
+    Split a byte range of a buffer into newline-aligned chunks.
+
+    Every chunk ends just after a newline (or at `end`), so no line is
+    ever split between two chunks. A line longer than `chunk_size`
+    is kept whole in a chunk of its own.
+
+    Args:
+        buffer (mmap.mmap): The memory-mapped file.
+        start (int): Offset of the first byte of the range.
+        end (int): Offset just past the last byte of the range.
+        chunk_size (int): Target size of each chunk in bytes.
+
+    Yields:
+        Tuple[int, int]: The start and end offsets of each chunk.
+    """
+    while start < end:
+        stop = min(start + chunk_size, end)
+        if stop < end:
+            newline = buffer.find(b"\n", stop - 1, end)
+            stop = end if newline == -1 else newline + 1
+        yield start, stop
+        start = stop
+
+
+def redact_buffer(
+    buffer: mmap.mmap, output: BinaryIO, redactor: Redactor,
+    start: int = 0, end: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """
+    Redact a byte range of a memory-mapped file into an output stream.
+
+    Args:
+        buffer (mmap.mmap): The memory-mapped input file.
+        output (BinaryIO): Binary stream receiving the redacted lines.
+        redactor (Redactor): The redaction engine to apply.
+        start (int): Offset of the first byte to redact.
+        end (int): Offset just past the last byte, defaults to the end.
+        chunk_size (int): Target size of each chunk in bytes.
+
+    Returns:
+        int: The number of input bytes processed.
+    """
+    end = len(buffer) if end is None else end
+    for chunk_start, chunk_end in line_ranges(buffer, start, end,
+                                              chunk_size):
+        output.write(redactor.redact_lines(buffer[chunk_start:chunk_end]))
+    return end - start
+
+
+def redact_file(
+    src: str, output: BinaryIO, fields: Sequence[str] = PII_FIELDS,
+    redaction: str = RedactingFormatter.REDACTION,
+    separator: str = RedactingFormatter.SEPARATOR,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """
+    Redact a whole log file into an output stream.
+
+    The file is memory-mapped and processed in newline-aligned chunks of
+    bytes, so memory use stays bounded by `chunk_size` whatever the size
+    of the file. Each line is redacted exactly like `filter_datum` would
+    redact it as a single message.
+
+    Args:
+        src (str): Path of the log file to redact.
+        output (BinaryIO): Binary stream receiving the redacted lines.
+        fields (Sequence[str]): Field names to be redacted.
+        redaction (str): String to replace the sensitive information.
+        separator (str): Character used to separate fields.
+        chunk_size (int): Target size of each chunk in bytes.
+
+    Returns:
+        int: The number of input bytes processed.
+    """
+    redactor = Redactor(fields, redaction, separator)
+    with open(src, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if hasattr(buffer, "madvise"):
+                buffer.madvise(mmap.MADV_SEQUENTIAL)
+            return redact_buffer(buffer, output, redactor,
+                                 chunk_size=chunk_size)
+
+
+def split_ranges(src: str, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split a file into at most `parts` newline-aligned byte ranges.
+
+    Args:
+        src (str): Path of the file to split.
+        parts (int): Desired number of ranges.
+
+    Returns:
+        List[Tuple[int, int]]: The start and end offsets of each range.
+    """
+    with open(src, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return list(line_ranges(buffer, 0, size,
+                                    max(1, -(-size // max(1, parts)))))
+
+
+def _init_worker(fields: Sequence[str], redaction: str, separator: str,
+                 chunk_size: int) -> None:
+    """
+    Build the redaction engine once per worker process.
+
+    Args:
+        fields (Sequence[str]): Field names to be redacted.
+        redaction (str): String to replace the sensitive information.
+        separator (str): Character used to separate fields.
+        chunk_size (int): Target size of each chunk in bytes.
+    """
+    global _worker_redactor, _worker_chunk_size
+    _worker_redactor = Redactor(fields, redaction, separator)
+    _worker_chunk_size = chunk_size
+
+
+def _redact_range(src: str, start: int, end: int,
+                  spool_dir: str) -> Tuple[str, RangeStats]:
+    """
+    Redact one byte range of a file into a temporary spool file.
+
+    Args:
+        src (str): Path of the file to redact.
+        start (int): Offset of the first byte of the range.
+        end (int): Offset just past the last byte of the range.
+        spool_dir (str): Directory receiving the spool file.
+
+    Returns:
+        Tuple[str, RangeStats]: The spool file path and the range stats.
+    """
+    started = time.perf_counter()
+    fd, spool = tempfile.mkstemp(dir=spool_dir, suffix=".part")
+    with os.fdopen(fd, "wb") as output, open(src, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            redact_buffer(buffer, output, _worker_redactor, start, end,
+                          _worker_chunk_size)
+    elapsed = time.perf_counter() - started
+    return spool, RangeStats(os.getpid(), src, start, end, elapsed)
+
+
+def redact_parallel(
+    jobs: Sequence[Tuple[str, BinaryIO]], workers: int = None,
+    fields: Sequence[str] = PII_FIELDS,
+    redaction: str = RedactingFormatter.REDACTION,
+    separator: str = RedactingFormatter.SEPARATOR,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> List[RangeStats]:
+    """
+    Redact several log files across a pool of worker processes.
+
+    Every file is cut into newline-aligned byte ranges that are redacted
+    concurrently into spool files, then stitched back in order into the
+    output stream paired with the file. Only the spool files and one
+    chunk per worker are ever held, so memory stays bounded.
+
+    Args:
+        jobs (Sequence[Tuple[str, BinaryIO]]): Pairs of input path and
+                                               binary output stream.
+        workers (int): Number of worker processes, defaults to the CPUs.
+        fields (Sequence[str]): Field names to be redacted.
+        redaction (str): String to replace the sensitive information.
+        separator (str): Character used to separate fields.
+        chunk_size (int): Target size of each chunk in bytes.
+
+    Returns:
+        List[RangeStats]: Timing of every redacted range, in file order.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = []
+    with tempfile.TemporaryDirectory(prefix="redact-") as spool_dir, \
+            ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(tuple(fields), redaction, separator, chunk_size)
+            ) as pool:
+        pending = []
+        for src, output in jobs:
+            for start, end in split_ranges(src, workers * RANGES_PER_WORKER):
+                future = pool.submit(_redact_range, src, start, end,
+                                     spool_dir)
+                pending.append((future, output))
+        for future, output in pending:
+            spool, range_stats = future.result()
+            with open(spool, "rb") as part:
+                shutil.copyfileobj(part, output)
+            os.remove(spool)
+            stats.append(range_stats)
+    return stats
+
+
+def redact_directory(
+    src_dir: str, dst_dir: str, workers: int = None,
+    fields: Sequence[str] = PII_FIELDS, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> List[RangeStats]:
+    """
+    Redact every file of a directory of rotated logs in parallel.
+
+    Args:
+        src_dir (str): Directory holding the log files.
+        dst_dir (str): Directory receiving files of the same names.
+        workers (int): Number of worker processes, defaults to the CPUs.
+        fields (Sequence[str]): Field names to be redacted.
+        chunk_size (int): Target size of each chunk in bytes.
+
+    Returns:
+        List[RangeStats]: Timing of every redacted range, in file order.
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+    names = sorted(name for name in os.listdir(src_dir)
+                   if os.path.isfile(os.path.join(src_dir, name)))
+    outputs = [open(os.path.join(dst_dir, name), "wb") for name in names]
+    try:
+        jobs = [(os.path.join(src_dir, name), output)
+                for name, output in zip(names, outputs)]
+        return redact_parallel(jobs, workers, fields, chunk_size=chunk_size)
+    finally:
+        for output in outputs:
+            output.close()
+
+
+def worker_throughput(stats: Sequence[RangeStats]) -> Dict[int, float]:
+    """
+    Compute the redaction throughput of each worker process.
+
+    Args:
+        stats (Sequence[RangeStats]): Timing of the redacted ranges.
+
+    Returns:
+        Dict[int, float]: Bytes per second keyed by worker PID.
+    """
+    sizes, seconds = {}, {}
+    for item in stats:
+        sizes[item.pid] = sizes.get(item.pid, 0) + item.end - item.start
+        seconds[item.pid] = seconds.get(item.pid, 0.0) + item.seconds
+    return {pid: sizes[pid] / seconds[pid] if seconds[pid] else 0.0
+            for pid in sizes}
+
+
+class ColumnRedactor:
+    """
+    Redactor for tabular rows that replaces PII columns by index.
+
+    The PII columns are looked up once in the header, so rows are
+    redacted without scanning any value.
+    """
+
+    def __init__(self, header: Sequence[str],
+                 columns: Sequence[str] = PII_FIELDS,
+                 redaction: str = RedactingFormatter.REDACTION):
+        """
+        Locate the PII columns in a header row.
+
+        Args:
+            header (Sequence[str]): The column names of the table.
+            columns (Sequence[str]): Names of the columns to redact.
+            redaction (str): String replacing the redacted values.
+        """
+        wanted = frozenset(columns)
+        self.indexes = tuple(index for index, name in enumerate(header)
+                             if name in wanted)
+        self.redaction = redaction
+
+    def redact_row(self, row: List[str]) -> List[str]:
+        """
+        Replace the PII values of a row, in place.
+
+        Args:
+            row (List[str]): The values of one row.
+
+        Returns:
+            List[str]: The same row, redacted.
+        """
+        size = len(row)
+        for index in self.indexes:
+            if index < size:
+                row[index] = self.redaction
+        return row
+
+
+def redact_csv(source: TextIO, output: TextIO,
+               columns: Sequence[str] = PII_FIELDS,
+               redaction: str = RedactingFormatter.REDACTION,
+               quoting: int = csv.QUOTE_MINIMAL) -> int:
+    """
+    Stream a CSV table with a header row, redacting PII columns.
+
+    Rows are parsed and written with the csv module, so quoted values
+    holding commas, quotes or newlines are handled correctly; only the
+    header is matched against `columns`, never the values.
+
+    Args:
+        source (TextIO): The CSV input, opened with newline="".
+        output (TextIO): The CSV output, opened with newline="".
+        columns (Sequence[str]): Names of the columns to redact.
+        redaction (str): String replacing the redacted values.
+        quoting (int): csv quoting mode of the output.
+
+    Returns:
+        int: The number of redacted data rows.
+    """
+    reader = csv.reader(source)
+    writer = csv.writer(output, quoting=quoting)
+    header = next(reader, None)
+    if header is None:
+        return 0
+    writer.writerow(header)
+    redact_row = ColumnRedactor(header, columns, redaction).redact_row
+    count = 0
+    for row in reader:
+        writer.writerow(redact_row(row))
+        count += 1
+    return count
+
+
+def parse_args(argv: Sequence[str] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments of the stream redactor.
+
+    A directory input needs an output directory, and the output may not
+    be the input itself, as every output is truncated before reading.
+
+    Args:
+        argv (Sequence[str]): Arguments to parse, defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="stream_redactor",
+        description="Redact PII fields from large log files.")
+    parser.add_argument("input", help="log file or directory to redact")
+    parser.add_argument("output", nargs="?", default="-",
+                        help="destination file or directory, "
+                             "'-' for stdout")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes, 0 for one per CPU")
+    parser.add_argument("--fields", default=",".join(PII_FIELDS),
+                        help="comma-separated field names to redact")
+    parser.add_argument("--csv", action="store_true",
+                        help="treat the input as a CSV table and redact "
+                             "the columns named by --fields")
+    parser.add_argument("--chunk-size", type=int,
+                        default=DEFAULT_CHUNK_SIZE,
+                        help="chunk size in bytes")
+    args = parser.parse_args(argv)
+    if os.path.isdir(args.input) and not args.csv and args.output == "-":
+        parser.error("a directory input needs an output directory")
+    if args.output != "-" and os.path.exists(args.output) \
+            and os.path.samefile(args.input, args.output):
+        parser.error("the output would overwrite the input")
+    return args
+
+
+def main(argv: Sequence[str] = None) -> None:
+    """
+    Redact a log file or directory from the command line and report
+    throughput, per worker when running in parallel.
+
+    Args:
+        argv (Sequence[str]): Arguments to parse, defaults to sys.argv.
+    """
+    args = parse_args(argv)
+    fields = [field for field in args.fields.split(",") if field]
+    workers = args.workers or os.cpu_count() or 1
+    stats = None
+    started = time.perf_counter()
+    if args.csv:
+        output = sys.stdout if args.output == "-" \
+            else open(args.output, "w", newline="")
+        try:
+            with open(args.input, newline="") as source:
+                rows = redact_csv(source, output, fields)
+        finally:
+            output.flush()
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0.0
+        print("redacted {} rows in {:.2f}s ({:.0f} rows/s)".format(
+            rows, elapsed, rate), file=sys.stderr)
+        return
+    if os.path.isdir(args.input):
+        stats = redact_directory(args.input, args.output, workers, fields,
+                                 args.chunk_size)
+        size = sum(item.end - item.start for item in stats)
+    else:
+        output = sys.stdout.buffer if args.output == "-" \
+            else open(args.output, "wb")
+        try:
+            if workers > 1:
+                stats = redact_parallel([(args.input, output)], workers,
+                                        fields, chunk_size=args.chunk_size)
+                size = sum(item.end - item.start for item in stats)
+            else:
+                size = redact_file(args.input, output, fields,
+                                   chunk_size=args.chunk_size)
+        finally:
+            output.flush()
+            if output is not sys.stdout.buffer:
+                output.close()
+    elapsed = time.perf_counter() - started
+    mib = 1024 * 1024
+    rate = size / elapsed / mib if elapsed else 0.0
+    print("redacted {} bytes in {:.2f}s ({:.1f} MiB/s)".format(
+        size, elapsed, rate), file=sys.stderr)
+    if stats:
+        for pid, throughput in sorted(worker_throughput(stats).items()):
+            print("  worker {}: {:.1f} MiB/s".format(pid, throughput / mib),
+                  file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+-- index backing the incremental export of filtered_logger
+-- (range scans on last_login with email as tiebreaker)
+USE my_db;
+
+CREATE INDEX users_last_login_email ON users (last_login, email);
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """Base module for object persistence and serialization."""
 from datetime import datetime
-from typing import TypeVar, List, Iterable
+from typing import TypeVar, List, Iterable, Tuple
 from os import path
 import json
 import uuid
@@ -9,13 +9,20 @@ import uuid
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
 
 
 class Base():
     """
     Base class for persistent objects with JSON serialization.
+
+    Attributes listed in `INDEXED_ATTRIBUTES` get a hash index that
+    `search` uses for equality lookups, as of the last `save`.
     """
 
+    INDEXED_ATTRIBUTES: Tuple[str, ...] = ()
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a Base instance with a unique ID and timestamps.
@@ -23,6 +30,7 @@ class Base():
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
             DATA[s_class] = {}
+            self.__class__._reset_indexes()
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
@@ -60,6 +68,52 @@ class Base():
                 result[key] = value
         return result
 
+    @classmethod
+    def _reset_indexes(cls):
+        """
+        Drop every index entry of this class.
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls.INDEXED_ATTRIBUTES}
+        INDEXED_VALUES[s_class] = {}
+
+    @classmethod
+    def _index(cls, obj: TypeVar('Base')):
+        """
+        Add an object, already stored in DATA, to the indexes.
+        """
+        if not cls.INDEXED_ATTRIBUTES:
+            return
+        cls._unindex(obj.id)
+        s_class = cls.__name__
+        values = tuple(getattr(obj, attr, None)
+                       for attr in cls.INDEXED_ATTRIBUTES)
+        for attr, value in zip(cls.INDEXED_ATTRIBUTES, values):
+            try:
+                INDEXES[s_class][attr].setdefault(value, {})[obj.id] = obj
+            except TypeError:
+                pass
+        INDEXED_VALUES[s_class][obj.id] = values
+
+    @classmethod
+    def _unindex(cls, obj_id: str):
+        """
+        Remove an object from the indexes.
+        """
+        s_class = cls.__name__
+        values = INDEXED_VALUES[s_class].pop(obj_id, None)
+        if values is None:
+            return
+        for attr, value in zip(cls.INDEXED_ATTRIBUTES, values):
+            try:
+                bucket = INDEXES[s_class][attr].get(value)
+            except TypeError:
+                continue
+            if bucket is not None:
+                bucket.pop(obj_id, None)
+                if not bucket:
+                    del INDEXES[s_class][attr][value]
+
     @classmethod
     def load_from_file(cls):
         """
@@ -68,6 +122,7 @@ class Base():
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
         DATA[s_class] = {}
+        cls._reset_indexes()
         if not path.exists(file_path):
             return
 
@@ -75,6 +130,7 @@ class Base():
             objs_json = json.load(f)
             for obj_id, obj_json in objs_json.items():
                 DATA[s_class][obj_id] = cls(**obj_json)
+                cls._index(DATA[s_class][obj_id])
 
     @classmethod
     def save_to_file(cls):
@@ -97,6 +153,7 @@ class Base():
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
         DATA[s_class][self.id] = self
+        self.__class__._index(self)
         self.__class__.save_to_file()
 
     def remove(self):
@@ -106,6 +163,7 @@ class Base():
         s_class = self.__class__.__name__
         if DATA[s_class].get(self.id) is not None:
             del DATA[s_class][self.id]
+            self.__class__._unindex(self.id)
             self.__class__.save_to_file()
 
     @classmethod
@@ -134,7 +192,8 @@ class Base():
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """
-        Search all objects with matching attributes.
+        Search all objects with matching attributes,
+        through an index when one covers the query.
         """
         s_class = cls.__name__
 
@@ -146,4 +205,12 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        objs = DATA[s_class].values()
+        for k, v in attributes.items():
+            if k in cls.INDEXED_ATTRIBUTES:
+                try:
+                    objs = INDEXES[s_class][k].get(v, {}).values()
+                except TypeError:
+                    continue
+                break
+        return list(filter(_search, objs))
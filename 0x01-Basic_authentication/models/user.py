@@ -12,6 +12,8 @@ class User(Base):
     and handling authentication.
     """
 
+    INDEXED_ATTRIBUTES = ('email',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a User instance with optional attributes.
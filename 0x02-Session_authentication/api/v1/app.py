@@ -13,6 +13,7 @@ from api.v1.auth.basic_auth import BasicAuth
 from api.v1.auth.session_auth import SessionAuth
 from api.v1.auth.session_db_auth import SessionDBAuth
 from api.v1.auth.session_exp_auth import SessionExpAuth
+from models import base
 
 app = Flask(__name__)
 app.register_blueprint(app_views)
@@ -33,6 +34,14 @@ if auth_type == 'session_db_auth':
     auth = SessionDBAuth()
 
 
+@app.before_request
+def refresh_store():
+    """
+    Pick up the objects other workers wrote since the last request.
+    """
+    base.refresh()
+
+
 @app.before_request
 def authenticate_user():
     """
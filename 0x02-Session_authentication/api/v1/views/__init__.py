@@ -14,6 +14,8 @@ app_views = Blueprint("app_views", __name__, url_prefix="/api/v1")
 from api.v1.views.index import *  # noqa: E402
 from api.v1.views.users import *  # noqa: E402
 from api.v1.views.session_auth import *  # noqa: E402
+from models.user_session import UserSession  # noqa: E402
 
-# Load user data from file
+# Load user and session data from file
 User.load_from_file()
+UserSession.load_from_file()
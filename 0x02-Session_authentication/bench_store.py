@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the memory held by the object store models, and of the
+time a worker takes to load them at boot.
+
+Usage: python3 bench_store.py [--objects N] [--users N]
+                              [--boot-users N [N ...]]
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Sequence
+
+from models import base
+from models.user import User
+from models.user_session import UserSession
+
+
+class LegacySession():
+    """Session laid out as before slots: a __dict__ and two datetimes.
+    """
+
+    def __init__(self, user_id: str, session_id: str):
+        """Initialize a LegacySession instance.
+        """
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.user_id = user_id
+        self.session_id = session_id
+
+
+def measure_memory(factory: Callable[[str, str], object], count: int,
+                   users: int) -> Dict[str, float]:
+    """
+    Measure the memory held by `count` sessions spread over `users`.
+
+    Args:
+        factory (Callable[[str, str], object]): Builds one session from
+                                                a user ID and session ID.
+        count (int): Number of sessions.
+        users (int): Number of distinct user IDs.
+
+    Returns:
+        Dict[str, float]: total_bytes and bytes_per_object.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objs = [factory("user-{}".format(i % users), str(uuid.uuid4()))
+                for i in range(count)]
+        total = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del objs
+    return {"total_bytes": total, "bytes_per_object": total / count}
+
+
+def measure_boot(count: int) -> Dict[str, Dict[str, float]]:
+    """
+    Time `User.load_from_file` over `count` users in each format.
+
+    Users get distinct timestamps, so the JSON path cannot lean on
+    its timestamp cache. The lazy case maps the JSON snapshot with its
+    span index already written, as on every start after the first.
+
+    Args:
+        count (int): Number of users.
+
+    Returns:
+        Dict[str, Dict[str, float]]: seconds and file_bytes per format.
+    """
+    cwd = os.getcwd()
+    saved_format = base.SNAPSHOT_FORMAT
+    saved_load_mode = base.LOAD_MODE
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            base.DATA['User'] = {}
+            start = int(time.time()) - count
+            for i in range(count):
+                user = User(email="user{}@example.com".format(i),
+                            _password="0" * 64, first_name="Bob")
+                user._created = user._updated = start + i
+                base.DATA['User'][user.id] = user
+            for case, snapshot_format, load_mode in (
+                    ("json", "json", "eager"),
+                    ("binary", "binary", "eager"),
+                    ("lazy", "json", "lazy")):
+                base.SNAPSHOT_FORMAT = snapshot_format
+                base.LOAD_MODE = load_mode
+                User.save_to_file()
+                base.parse_timestamp.cache_clear()
+                started = time.perf_counter()
+                User.load_from_file()
+                suffix = "bin" if snapshot_format == "binary" else "json"
+                results[case] = {
+                    "seconds": time.perf_counter() - started,
+                    "file_bytes": os.path.getsize(".db_User." + suffix),
+                }
+                if load_mode == "lazy":
+                    base.LAZY.clear()
+        finally:
+            base.SNAPSHOT_FORMAT = saved_format
+            base.LOAD_MODE = saved_load_mode
+            base.DATA['User'] = {}
+            os.chdir(cwd)
+    return results
+
+
+def main(argv: Sequence[str] = None) -> None:
+    """
+    Compare the memory of slotted and legacy sessions, print JSON.
+
+    Args:
+        argv (Sequence[str]): Arguments to parse, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        prog="bench_store", description="Benchmark the object store.")
+    parser.add_argument("--objects", type=int, default=1000000,
+                        help="sessions built per case")
+    parser.add_argument("--users", type=int, default=10000,
+                        help="distinct user IDs among the sessions")
+    parser.add_argument("--boot-users", type=int, nargs="*",
+                        default=[100000, 1000000],
+                        help="user counts of the boot time cases")
+    args = parser.parse_args(argv)
+
+    results = {
+        "memory/legacy": measure_memory(LegacySession, args.objects,
+                                        args.users),
+        "memory/slots": measure_memory(
+            lambda user_id, session_id: UserSession(
+                user_id=user_id, session_id=session_id),
+            args.objects, args.users),
+    }
+    for count in args.boot_users:
+        for snapshot_format, result in measure_boot(count).items():
+            results["boot/{}/{}".format(snapshot_format, count)] = result
+    print(json.dumps({
+        "python": platform.python_version(),
+        "objects": args.objects,
+        "results": results,
+    }, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
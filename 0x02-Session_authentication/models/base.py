@@ -1,23 +1,262 @@
 #!/usr/bin/env python3
 """
 Base module for object management and persistence.
+
+Objects of each class are stored in `.db_<Class>.json`. With the
+`STORAGE_MODE` environment variable set to `journal`, `save` and
+`remove` append one record to `.db_<Class>.journal` instead of
+rewriting that file, and the journal is compacted into a new snapshot
+in the background once it holds `JOURNAL_THRESHOLD` records.
+
+With `STORAGE_MODE` set to `write_behind`, `save` and `remove` only
+mark the class dirty, and a background flusher writes each dirty class
+with one `save_to_file` every `FLUSH_INTERVAL` seconds, or sooner once
+`FLUSH_MUTATIONS` mutations are pending. `flush()` writes them at once
+and also runs at interpreter exit. The durability window is therefore
+`FLUSH_INTERVAL` seconds or `FLUSH_MUTATIONS` mutations, whichever comes
+first: a crash or SIGKILL loses at most the mutations made within it.
+`load_from_file` writes the pending mutations of its class before
+reading the file back, so a reload never drops accepted saves.
+
+With `SNAPSHOT_FORMAT` set to `binary`, snapshots are written to
+`.db_<Class>.bin` instead: a header (magic, format version, schema
+version, object count, payload size, CRC-32) followed by the objects
+marshalled column by column, with timestamps as epoch seconds.
+`.db_<Class>.json` is still read when there is no binary snapshot, and
+`export_json` writes it, so JSON remains the import and export format;
+export before switching back to JSON snapshots.
+
+JSON snapshots hold one object per line. With `LOAD_MODE` set to
+`lazy`, `load_from_file` memory-maps `.db_<Class>.json` and only reads
+the byte span of each object and its indexed attributes, kept in
+`.db_<Class>.idx` for the next start. Objects are decoded on their
+first `get`; `count` is answered from the spans, and `all` and `search`
+decode the objects they walk over without keeping them in DATA.
+
+The store is safe to use from several threads. Each class has a
+`ReadWriteLock`: `get`, `count`, `all` and `search` share it, while
+`save`, `remove` and loading take it alone. `save_to_file` copies the
+objects under the shared lock, so a flush sees one consistent state and
+does not hold back readers.
+
+Several processes, such as pre-fork workers, can share the files. Each
+class has a `.db_<Class>.lock` file, locked with flock while a process
+writes a snapshot, appends to the journal or loads. `refresh()` checks
+with stat calls, at most every `STORE_REFRESH_MS` milliseconds, whether
+another process changed the files. In journal mode it then replays only
+the records appended since the last check, and reloads everything only
+after a compaction. In file mode there is nothing incremental: it
+re-reads the whole snapshot whenever it changed, and `save`/`remove`
+do the same under the lock file before writing a new one, so that every
+write starts from the latest snapshot. Direct calls to `save_to_file`
+in file mode must do so too, by running within `_writer()`.
+Write-behind mode is not shared: each process keeps and writes its own
+objects, and `refresh()` leaves it alone.
 """
+import atexit
+import fcntl
+import gc
 import json
+import marshal
+import mmap
+import os
+import struct
+import zlib
+import threading
+import time
 import uuid
 from os import path
-from datetime import datetime
-from typing import TypeVar, List, Iterable
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain
+from typing import TypeVar, List, Iterable, Tuple, Dict
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+TIMESTAMP_SLOTS = {'_created': 'created_at', '_updated': 'updated_at'}
+SLOT_NAMES = {}
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+STORAGE_MODE = os.getenv('STORAGE_MODE', 'file')
+JOURNAL_THRESHOLD = int(os.getenv('JOURNAL_THRESHOLD', '1000'))
+JOURNAL_SIZES = {}
+_journal_lock = threading.RLock()
+_snapshot_lock = threading.Lock()
+_compacting = set()
+FLUSH_INTERVAL = float(os.getenv('FLUSH_INTERVAL', '1.0'))
+FLUSH_MUTATIONS = int(os.getenv('FLUSH_MUTATIONS', '100'))
+_dirty = {}
+_dirty_lock = threading.Lock()
+_flush_requested = threading.Event()
+_flusher = None
+SNAPSHOT_FORMAT = os.getenv('SNAPSHOT_FORMAT', 'json')
+SNAPSHOT_MAGIC = b'BSNP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sHHQQI')
+LOAD_MODE = os.getenv('LOAD_MODE', 'eager')
+LAZY = {}
+LOCKS = {}
+FILE_LOCKS = {}
+GENERATIONS = {}
+STORES = {}
+REFRESH_INTERVAL = float(os.getenv('STORE_REFRESH_MS', '0')) / 1000.0
+_next_refresh = {}
+
+
+def flush(classes: Iterable = None):
+    """Write every class with pending write-behind mutations.
+
+    Args:
+        classes (Iterable): Only write these classes, if given.
+    """
+    with _dirty_lock:
+        pending = [cls for cls in _dirty
+                   if classes is None or cls in classes]
+        for cls in pending:
+            del _dirty[cls]
+    for i, cls in enumerate(pending):
+        try:
+            cls.save_to_file()
+        except Exception:
+            with _dirty_lock:
+                for unsaved in pending[i:]:
+                    _dirty[unsaved] = _dirty.get(unsaved, 0) + 1
+            raise
+
+
+def refresh():
+    """Catch up every loaded class with changes made by other processes.
+    """
+    for cls in list(STORES.values()):
+        cls.refresh()
+
+
+def _flush_loop():
+    """Flush dirty classes every FLUSH_INTERVAL seconds or on request.
+    """
+    while True:
+        _flush_requested.wait(FLUSH_INTERVAL)
+        _flush_requested.clear()
+        try:
+            flush()
+        except Exception:
+            pass
+
+
+def _mark_dirty(cls):
+    """Record a write-behind mutation of a class.
+
+    Starts the flusher on first use, and wakes it once
+    FLUSH_MUTATIONS mutations are pending for the class.
+    """
+    global _flusher
+    with _dirty_lock:
+        _dirty[cls] = _dirty.get(cls, 0) + 1
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, daemon=True)
+            _flusher.start()
+        if _dirty[cls] >= FLUSH_MUTATIONS:
+            _flush_requested.set()
+
+
+atexit.register(flush)
+
+
+class ReadWriteLock():
+    """
+    Lock held by any number of readers or by a single writer.
+
+    A writer waiting for the lock holds new readers back, so a steady
+    flow of readers cannot starve it. The writer may take the lock
+    again, for reading or writing; readers must not nest.
+    """
+
+    def __init__(self):
+        """Initialize an unlocked ReadWriteLock.
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._depth = 0
+        self._waiting_writers = 0
+
+    @contextmanager
+    def reading(self):
+        """Hold the lock shared with other readers.
+        """
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def writing(self):
+        """Hold the lock alone.
+        """
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._waiting_writers -= 1
+                self._writer = me
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+def to_epoch(value: datetime) -> int:
+    """Convert a naive UTC datetime to whole epoch seconds.
+    """
+    return (value - EPOCH) // timedelta(seconds=1)
+
+
+@lru_cache(maxsize=65536)
+def parse_timestamp(value: str) -> int:
+    """Convert a TIMESTAMP_FORMAT string to epoch seconds.
+
+    Results are cached, as objects loaded in bulk share most of
+    their timestamps.
+    """
+    return to_epoch(datetime.fromisoformat(value))
 
 
 class Base():
     """
     Base class for managing object creation, serialization, and persistence.
+
+    Subclasses list attributes in `INDEXED_ATTRIBUTES` to get a hash
+    index that `search` uses for equality lookups. Indexes reflect
+    the attribute values at the last `save`.
+
+    Instances are slotted: subclasses declare their attributes in
+    `__slots__`, and timestamps are kept as epoch seconds, exposed as
+    naive UTC datetimes by the `created_at` and `updated_at` properties.
     """
 
+    __slots__ = ('id', '_created', '_updated')
+    INDEXED_ATTRIBUTES: Tuple[str, ...] = ()
+    SCHEMA_VERSION = 1
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a Base instance.
@@ -33,19 +272,111 @@ class Base():
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            with self.__class__._lock().writing():
+                if DATA.get(s_class) is None:
+                    self.__class__._reset_indexes()
+                    DATA[s_class] = {}
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
+        now = int(time.time())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self._created = parse_timestamp(kwargs.get('created_at'))
         else:
-            self.created_at = datetime.utcnow()
+            self._created = now
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self._updated = parse_timestamp(kwargs.get('updated_at'))
         else:
-            self.updated_at = datetime.utcnow()
+            self._updated = now
+
+    @property
+    def created_at(self) -> datetime:
+        """Get the creation time as a naive UTC datetime.
+        """
+        return EPOCH + timedelta(seconds=self._created)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        """Set the creation time from a naive UTC datetime.
+        """
+        self._created = to_epoch(value)
+
+    @property
+    def updated_at(self) -> datetime:
+        """Get the last update time as a naive UTC datetime.
+        """
+        return EPOCH + timedelta(seconds=self._updated)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        """Set the last update time from a naive UTC datetime.
+        """
+        self._updated = to_epoch(value)
+
+    @classmethod
+    def _lock(cls) -> ReadWriteLock:
+        """Return the lock guarding the objects of this class.
+        """
+        lock = LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = LOCKS.setdefault(cls.__name__, ReadWriteLock())
+        return lock
+
+    @classmethod
+    @contextmanager
+    def _file_lock(cls):
+        """Hold the lock file of this class, excluding other processes.
+
+        The lock is reentrant within a thread. The lock file is opened
+        again in a forked child, as flock locks are shared with the
+        parent through an inherited descriptor.
+        """
+        state = FILE_LOCKS.get(cls.__name__)
+        if state is None:
+            state = FILE_LOCKS.setdefault(cls.__name__, {
+                'lock': threading.RLock(), 'pid': None, 'fd': None,
+                'depth': 0})
+        with state['lock']:
+            if not state['depth']:
+                if state['pid'] != os.getpid():
+                    state['fd'] = os.open(".db_{}.lock".format(cls.__name__),
+                                          os.O_RDWR | os.O_CREAT, 0o644)
+                    state['pid'] = os.getpid()
+                fcntl.flock(state['fd'], fcntl.LOCK_EX)
+            state['depth'] += 1
+            try:
+                yield
+            finally:
+                state['depth'] -= 1
+                if not state['depth']:
+                    fcntl.flock(state['fd'], fcntl.LOCK_UN)
+
+    @classmethod
+    @contextmanager
+    def _writer(cls):
+        """Hold the lock file and catch up with the other processes
+        before a change, so that it applies on top of their writes.
+
+        In journal mode the next record then follows the ones already
+        replayed; in file mode the snapshot written next includes their
+        objects. Write-behind mode takes no lock.
+        """
+        if STORAGE_MODE == 'write_behind':
+            yield
+            return
+        with cls._file_lock():
+            cls._sync()
+            yield
+
+    @classmethod
+    def _slot_names(cls) -> Tuple[str, ...]:
+        """Return the attribute slots of this class, base class first.
+        """
+        names = SLOT_NAMES.get(cls)
+        if names is None:
+            names = tuple(name for klass in reversed(cls.__mro__)
+                          for name in klass.__dict__.get('__slots__', ()))
+            SLOT_NAMES[cls] = names
+        return names
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """
@@ -74,58 +405,701 @@ class Base():
             dict: JSON representation of the object.
         """
         result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
+        for key in self._slot_names():
+            try:
+                value = getattr(self, key)
+            except AttributeError:
                 continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
+            if key in TIMESTAMP_SLOTS:
+                result[TIMESTAMP_SLOTS[key]] = time.strftime(
+                    TIMESTAMP_FORMAT, time.gmtime(value))
+            elif for_serialization or key[0] != '_':
                 result[key] = value
         return result
 
+    @classmethod
+    def _reset_indexes(cls):
+        """Drop every index entry of this class.
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls.INDEXED_ATTRIBUTES}
+        INDEXED_VALUES[s_class] = {}
+
+    @classmethod
+    def _index(cls, obj: TypeVar('Base')):
+        """Add an object to the indexes of this class.
+
+        Args:
+            obj (Base): The object, already stored in DATA.
+        """
+        if not cls.INDEXED_ATTRIBUTES:
+            return
+        cls._unindex(obj.id)
+        s_class = cls.__name__
+        values = tuple(getattr(obj, attr, None)
+                       for attr in cls.INDEXED_ATTRIBUTES)
+        for attr, value in zip(cls.INDEXED_ATTRIBUTES, values):
+            try:
+                INDEXES[s_class][attr].setdefault(value, {})[obj.id] = obj
+            except TypeError:
+                pass
+        INDEXED_VALUES[s_class][obj.id] = values
+
+    @classmethod
+    def _index_all(cls, objs: List[TypeVar('Base')]):
+        """Index freshly loaded objects, attribute by attribute.
+
+        Args:
+            objs (List[Base]): The objects, not indexed yet.
+        """
+        if not cls.INDEXED_ATTRIBUTES:
+            return
+        s_class = cls.__name__
+        columns = [[getattr(obj, attr, None) for obj in objs]
+                   for attr in cls.INDEXED_ATTRIBUTES]
+        for attr, values in zip(cls.INDEXED_ATTRIBUTES, columns):
+            index = INDEXES[s_class][attr]
+            for obj, value in zip(objs, values):
+                try:
+                    index.setdefault(value, {})[obj.id] = obj
+                except TypeError:
+                    pass
+        INDEXED_VALUES[s_class].update(
+            zip([obj.id for obj in objs], zip(*columns)))
+
+    @classmethod
+    def _unindex(cls, obj_id: str):
+        """Remove an object from the indexes of this class.
+
+        Args:
+            obj_id (str): ID of the object.
+        """
+        s_class = cls.__name__
+        values = INDEXED_VALUES[s_class].pop(obj_id, None)
+        if values is None:
+            return
+        for attr, value in zip(cls.INDEXED_ATTRIBUTES, values):
+            try:
+                bucket = INDEXES[s_class][attr].get(value)
+            except TypeError:
+                continue
+            if bucket is not None:
+                bucket.pop(obj_id, None)
+                if not bucket:
+                    del INDEXES[s_class][attr][value]
+
+    @classmethod
+    def _forget_span(cls, obj_id: str) -> bool:
+        """Drop the lazily loaded span of an object, if it has one.
+
+        Args:
+            obj_id (str): ID of the object.
+
+        Returns:
+            bool: True if the object had not been decoded yet.
+        """
+        lazy = LAZY.get(cls.__name__)
+        return lazy is not None and lazy[1].pop(obj_id, None) is not None
+
+    @classmethod
+    def _decode_span(cls, obj_id: str) -> TypeVar('Base'):
+        """Decode an object that has not been loaded yet.
+
+        The object is not stored in DATA.
+
+        Args:
+            obj_id (str): ID of the object.
+
+        Returns:
+            Base: The object, or None if it has no span (any more).
+        """
+        s_class = cls.__name__
+        mm, spans = LAZY.get(s_class, (None, {}))
+        span = spans.get(obj_id)
+        if span is None:
+            return DATA[s_class].get(obj_id)
+        return cls(**json.loads(mm[span[0]:span[1]]))
+
+    @classmethod
+    def _materialize(cls, obj_id: str) -> TypeVar('Base'):
+        """Decode an object that has not been loaded yet into DATA.
+
+        Args:
+            obj_id (str): ID of the object.
+
+        Returns:
+            Base: The object, or None if it does not exist.
+        """
+        s_class = cls.__name__
+        with cls._lock().writing():
+            obj = DATA[s_class].get(obj_id)
+            if obj is None:
+                obj = cls._decode_span(obj_id)
+                if obj is not None:
+                    DATA[s_class][obj_id] = obj
+                    cls._forget_span(obj_id)
+                    cls._index(obj)
+        return obj
+
+    @classmethod
+    def _write_json(cls, file_path: str,
+                    items: List[Tuple[str, bytes]]) -> Dict[str, Tuple]:
+        """Write encoded objects as a JSON snapshot, one per line.
+
+        Args:
+            file_path (str): Path of the snapshot.
+            items (List[Tuple[str, bytes]]): IDs and JSON of the objects.
+
+        Returns:
+            Dict[str, Tuple]: The (start, end) byte span of each object.
+        """
+        spans = {}
+        pos = 2
+        last = len(items) - 1
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(b"{\n")
+            for i, (obj_id, raw) in enumerate(items):
+                key = json.dumps(obj_id).encode() + b": "
+                spans[obj_id] = (pos + len(key), pos + len(key) + len(raw))
+                line = key + raw + (b",\n" if i < last else b"\n")
+                f.write(line)
+                pos += len(line)
+            f.write(b"}\n")
+        os.replace(tmp_path, file_path)
+        return spans
+
+    @classmethod
+    def _scan_json(cls, mm: mmap.mmap) -> Tuple[Dict, Dict]:
+        """Find the span and indexed values of each object of a snapshot.
+
+        Args:
+            mm (mmap.mmap): The snapshot, one object per line.
+
+        Returns:
+            Tuple[Dict, Dict]: The (start, end) span and the tuple of
+                indexed values of each object, by ID.
+        """
+        spans = {}
+        values = {}
+        attrs = cls.INDEXED_ATTRIBUTES
+        pos = 2
+        size = len(mm)
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end < 0:
+                end = size
+            key_end = mm.find(b'": ', pos, end) + 1
+            if key_end > pos:
+                obj_id = json.loads(mm[pos:key_end])
+                value_end = end - 1 if mm[end - 1:end] == b"," else end
+                spans[obj_id] = (key_end + 2, value_end)
+                if attrs:
+                    obj_json = json.loads(mm[key_end + 2:value_end])
+                    values[obj_id] = tuple(obj_json.get(attr)
+                                           for attr in attrs)
+            pos = end + 1
+        return spans, values
+
+    @classmethod
+    def _write_lazy_index(cls, stat: os.stat_result, spans: Dict,
+                          values: Dict):
+        """Store the spans of a snapshot for the next lazy load.
+
+        Args:
+            stat (os.stat_result): Status of the snapshot file.
+            spans (Dict): The span of each object, by ID.
+            values (Dict): The indexed values of each object, by ID.
+        """
+        index_path = ".db_{}.idx".format(cls.__name__)
+        with open(index_path + ".tmp", 'wb') as f:
+            f.write(marshal.dumps(
+                (stat.st_size, stat.st_mtime_ns, spans, values)))
+        os.replace(index_path + ".tmp", index_path)
+
+    @classmethod
+    def _load_lazy(cls, file_path: str) -> bool:
+        """Map a JSON snapshot without decoding its objects.
+
+        The spans come from `.db_<Class>.idx` when it matches the size
+        and modification time of the snapshot, else from a scan.
+
+        Args:
+            file_path (str): Path of the snapshot.
+
+        Returns:
+            bool: False if the snapshot is not one object per line.
+        """
+        s_class = cls.__name__
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size == 0:
+                return False
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:2] != b"{\n":
+            return False
+
+        index = None
+        try:
+            with open(".db_{}.idx".format(s_class), 'rb') as f:
+                index = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        if index is not None and \
+                index[:2] == (stat.st_size, stat.st_mtime_ns):
+            spans, values = index[2:]
+        else:
+            spans, values = cls._scan_json(mm)
+            cls._write_lazy_index(stat, spans, values)
+
+        LAZY[s_class] = (mm, spans)
+        for i, attr in enumerate(cls.INDEXED_ATTRIBUTES):
+            index = INDEXES[s_class][attr]
+            for obj_id, obj_values in values.items():
+                try:
+                    index.setdefault(obj_values[i], {})[obj_id] = None
+                except TypeError:
+                    pass
+        INDEXED_VALUES[s_class].update(values)
+        return True
+
+    @classmethod
+    def _journal_paths(cls) -> Tuple[str, str]:
+        """Return the paths of the live and the compacting journal.
+        """
+        journal_path = ".db_{}.journal".format(cls.__name__)
+        return journal_path, journal_path + ".old"
+
+    @classmethod
+    def _replay(cls, journal_path: str, offset: int = 0,
+                repair: bool = True) -> Tuple[int, int]:
+        """Apply the records of a journal file to DATA.
+
+        Reading stops at the first incomplete record. With `repair`,
+        used while holding the lock file, that record was left by a
+        crash in the middle of an append, and is cut off the file so
+        that new records follow the last complete one.
+
+        Args:
+            journal_path (str): Path of the journal file.
+            offset (int): Position of the first record to apply.
+            repair (bool): If True, truncate an incomplete record.
+
+        Returns:
+            Tuple[int, int]: Number of records applied, and the position
+                after the last one.
+        """
+        s_class = cls.__name__
+        count = 0
+        complete = offset
+        if not path.exists(journal_path):
+            return count, complete
+        with open(journal_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    if repair:
+                        os.truncate(journal_path, complete)
+                    break
+                complete += len(line)
+                if record['op'] == 'save':
+                    obj = cls(**record['obj'])
+                    DATA[s_class][obj.id] = obj
+                    cls._forget_span(obj.id)
+                    cls._index(obj)
+                else:
+                    DATA[s_class].pop(record['id'], None)
+                    cls._forget_span(record['id'])
+                    cls._unindex(record['id'])
+                count += 1
+        return count, complete
+
+    @classmethod
+    def _append(cls, record: dict):
+        """Append one record to the journal of this class.
+
+        Starts a background compaction once the journal holds
+        JOURNAL_THRESHOLD records.
+
+        Args:
+            record (dict): The mutation to record.
+        """
+        s_class = cls.__name__
+        line = json.dumps(record).encode() + b"\n"
+        with _journal_lock:
+            with open(cls._journal_paths()[0], 'ab') as f:
+                start = f.tell()
+                f.write(line)
+                end = f.tell()
+                ino = os.fstat(f.fileno()).st_ino
+            generation = GENERATIONS.get(s_class)
+            if generation is not None and generation[1] == start \
+                    and generation[0] in (ino, None):
+                GENERATIONS[s_class] = (ino, end, generation[2])
+            JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) + 1
+            if JOURNAL_SIZES[s_class] < JOURNAL_THRESHOLD \
+                    or s_class in _compacting:
+                return
+            _compacting.add(s_class)
+        threading.Thread(target=cls._compact, daemon=True).start()
+
+    @classmethod
+    def _compact(cls):
+        """Fold the journal into a new snapshot.
+        """
+        try:
+            cls.save_to_file()
+        finally:
+            with _journal_lock:
+                _compacting.discard(cls.__name__)
+
+    @classmethod
+    def _encode_snapshot(cls, objs: List[TypeVar('Base')]) -> bytes:
+        """Encode objects into the binary snapshot format.
+
+        Args:
+            objs (List[Base]): The objects to store.
+
+        Returns:
+            bytes: The header followed by the payload.
+        """
+        names = cls._slot_names()
+        columns = [[getattr(obj, name, None) for obj in objs]
+                   for name in names]
+        payload = marshal.dumps((names, columns))
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, cls.SCHEMA_VERSION,
+            len(objs), len(payload), zlib.crc32(payload))
+        return header + payload
+
+    @classmethod
+    def _decode_snapshot(cls, raw: bytes) -> List[TypeVar('Base')]:
+        """Decode a binary snapshot into objects.
+
+        Objects are built without `__init__`, then their slots are
+        filled column by column.
+
+        Args:
+            raw (bytes): The content of the snapshot file.
+
+        Returns:
+            List[Base]: The stored objects.
+
+        Raises:
+            ValueError: If the snapshot is corrupt or was written by
+                another format or schema version.
+        """
+        try:
+            magic, version, schema, count, size, checksum = \
+                SNAPSHOT_HEADER.unpack_from(raw)
+        except struct.error:
+            raise ValueError("truncated snapshot header")
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("unsupported snapshot format")
+        if schema != cls.SCHEMA_VERSION:
+            raise ValueError("snapshot schema {} does not match {}".format(
+                schema, cls.SCHEMA_VERSION))
+        payload = raw[SNAPSHOT_HEADER.size:]
+        if len(payload) != size or zlib.crc32(payload) != checksum:
+            raise ValueError("snapshot checksum mismatch")
+
+        names, columns = marshal.loads(payload)
+        if tuple(names) != cls._slot_names():
+            raise ValueError("snapshot attributes do not match the class")
+        if any(len(column) != count for column in columns):
+            raise ValueError("snapshot object count mismatch")
+        new = cls.__new__
+        objs = [new(cls) for _ in range(count)]
+        for name, column in zip(names, columns):
+            for _ in map(getattr(cls, name).__set__, objs, column):
+                pass
+        return objs
+
     @classmethod
     def load_from_file(cls):
         """Load all objects from file.
+
+        In binary mode the binary snapshot is read if there is one,
+        else the JSON file, lazily in lazy mode, then any journal
+        records. Pending write-behind mutations of the class are written
+        first, so that the load does not drop them. The cyclic garbage
+        collector is paused meanwhile: loading only creates objects, and
+        would otherwise trigger many useless collections.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
+        bin_path = ".db_{}.bin".format(s_class)
+        collecting = gc.isenabled()
+        with cls._file_lock(), cls._lock().writing():
+            if STORAGE_MODE == 'write_behind':
+                flush((cls,))
+            gc.disable()
+            try:
+                cls._load(file_path, bin_path)
+            finally:
+                if collecting:
+                    gc.enable()
+            STORES[s_class] = cls
+
+    @classmethod
+    def _load(cls, file_path: str, bin_path: str):
+        """Replace the objects of this class with those on disk.
+
+        Args:
+            file_path (str): Path of the JSON snapshot.
+            bin_path (str): Path of the binary snapshot.
+        """
+        s_class = cls.__name__
         DATA[s_class] = {}
-        if not path.exists(file_path):
+        LAZY.pop(s_class, None)
+        cls._reset_indexes()
+        JOURNAL_SIZES[s_class] = 0
+        if SNAPSHOT_FORMAT == 'binary' and path.exists(bin_path):
+            with open(bin_path, 'rb') as f:
+                objs = cls._decode_snapshot(f.read())
+            DATA[s_class] = {obj.id: obj for obj in objs}
+            cls._index_all(objs)
+        elif LOAD_MODE == 'lazy' and path.exists(file_path) \
+                and cls._load_lazy(file_path):
+            pass
+        elif path.exists(file_path):
+            with open(file_path, 'r') as f:
+                objs_json = json.load(f)
+                for obj_id, obj_json in objs_json.items():
+                    DATA[s_class][obj_id] = cls(**obj_json)
+            cls._index_all(list(DATA[s_class].values()))
+
+        for journal_path in reversed(cls._journal_paths()):
+            count, end = cls._replay(journal_path)
+            JOURNAL_SIZES[s_class] += count
+        try:
+            journal_ino = os.stat(journal_path).st_ino
+        except FileNotFoundError:
+            journal_ino = None
+        GENERATIONS[s_class] = (journal_ino, end, cls._snapshot_key())
+
+    @classmethod
+    def _snapshot_key(cls) -> Tuple[int, int, int]:
+        """Identify the current version of the snapshot file.
+
+        Returns:
+            Tuple[int, int, int]: Its inode, size and modification time,
+                or None if there is no snapshot.
+        """
+        file_path = ".db_{}.json".format(cls.__name__)
+        if SNAPSHOT_FORMAT == 'binary':
+            bin_path = ".db_{}.bin".format(cls.__name__)
+            if path.exists(bin_path):
+                file_path = bin_path
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    @classmethod
+    def refresh(cls):
+        """Catch up with changes made to the files by other processes.
+
+        Does nothing until REFRESH_INTERVAL has passed since the last
+        check, before the first `load_from_file`, or in write-behind
+        mode, whose pending objects a reload would drop.
+        """
+        s_class = cls.__name__
+        now = time.monotonic()
+        if now < _next_refresh.get(s_class, 0.0):
+            return
+        _next_refresh[s_class] = now + REFRESH_INTERVAL
+        cls._sync()
+
+    @classmethod
+    def _sync(cls):
+        """Compare the files with the last version seen, and catch up.
+
+        The journal and the snapshot are checked with a stat call each.
+        Records appended to the journal are replayed; a new snapshot is
+        loaded in full, which is the only way to catch up in file mode.
+        """
+        s_class = cls.__name__
+        generation = GENERATIONS.get(s_class)
+        if generation is None:
             return
+        journal_ino, offset, snapshot_key = generation
+        if STORAGE_MODE == 'journal':
+            try:
+                stat = os.stat(cls._journal_paths()[0])
+            except FileNotFoundError:
+                stat = None
+            if stat is None or (stat.st_ino, stat.st_size) == (journal_ino,
+                                                               offset):
+                if cls._snapshot_key() == snapshot_key:
+                    return
+            elif cls._catch_up():
+                return
+        elif STORAGE_MODE == 'write_behind' or \
+                cls._snapshot_key() == snapshot_key:
+            return
+        cls.load_from_file()
+
+    @classmethod
+    def _catch_up(cls) -> bool:
+        """Replay the journal records not seen yet.
+
+        The lock file keeps the journal from being compacted meanwhile.
+        An unchanged snapshot tells that the journal is the one already
+        replayed, even if a new journal got the inode of a deleted one.
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        Returns:
+            bool: True if caught up, False if a full load is needed.
+        """
+        s_class = cls.__name__
+        journal_path = cls._journal_paths()[0]
+        with cls._file_lock(), cls._lock().writing():
+            journal_ino, offset, snapshot_key = GENERATIONS[s_class]
+            try:
+                ino = os.stat(journal_path).st_ino
+            except FileNotFoundError:
+                ino = None
+            if cls._snapshot_key() != snapshot_key or \
+                    journal_ino not in (ino, None):
+                return False
+            if journal_ino is None:
+                offset = 0
+            count, end = cls._replay(journal_path, offset)
+            JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) + count
+            GENERATIONS[s_class] = (ino, end, snapshot_key)
+            return True
+
+    @classmethod
+    def export_json(cls, file_path: str = None):
+        """Write all objects to a JSON file.
+
+        Args:
+            file_path (str): Destination, defaults to `.db_<Class>.json`.
+        """
+        file_path = file_path or ".db_{}.json".format(cls.__name__)
+        objs_json = {}
+        for obj in cls.all():
+            objs_json[obj.id] = obj.to_json(True)
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(objs_json, f)
+        os.replace(tmp_path, file_path)
 
     @classmethod
     def save_to_file(cls):
         """Save all objects to file.
+
+        The snapshot replaces the file atomically. The journal is set
+        aside while the objects are copied, so records appended during
+        the write go to a fresh journal, and is deleted afterwards.
+        Objects not decoded yet are copied from the old snapshot as is.
+        The objects are copied under the shared lock of the class, so
+        the snapshot is consistent while readers carry on.
+
+        In journal mode the other processes' records are caught up
+        first. In file mode the objects of this process are written as
+        they are, over whatever other processes wrote: call it within
+        `_writer()`, changing only objects fetched in that block, as
+        `save`, `remove` and `migrate_passwords` do.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        journal_path, old_journal_path = cls._journal_paths()
+        with cls._file_lock(), _snapshot_lock:
+            if STORAGE_MODE == 'journal':
+                cls._sync()
+            with cls._lock().reading(), _journal_lock:
+                if path.exists(journal_path):
+                    os.replace(journal_path, old_journal_path)
+                JOURNAL_SIZES[s_class] = 0
+                objs = list(DATA[s_class].values())
+                mm, spans = LAZY.get(s_class, (None, {}))
+                lazy = list(spans.items())
+                if SNAPSHOT_FORMAT == 'binary':
+                    snapshot = cls._encode_snapshot(
+                        objs + [cls(**json.loads(mm[start:end]))
+                                for _, (start, end) in lazy])
+                else:
+                    objs_json = [(obj.id, obj.to_json(True))
+                                 for obj in objs]
+                    values = dict(INDEXED_VALUES.get(s_class, {}))
+            if SNAPSHOT_FORMAT == 'binary':
+                file_path = ".db_{}.bin".format(s_class)
+                tmp_path = file_path + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(snapshot)
+                os.replace(tmp_path, file_path)
+            else:
+                items = [(obj_id, json.dumps(obj_json).encode())
+                         for obj_id, obj_json in objs_json]
+                items.extend((obj_id, mm[start:end])
+                             for obj_id, (start, end) in lazy)
+                new_spans = cls._write_json(file_path, items)
+                if LOAD_MODE == 'lazy':
+                    cls._remap(file_path, new_spans, values)
+            if path.exists(old_journal_path):
+                os.remove(old_journal_path)
+            GENERATIONS[s_class] = (None, 0, cls._snapshot_key())
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def _remap(cls, file_path: str, spans: Dict, values: Dict):
+        """Switch lazy loading over to a freshly written snapshot.
+
+        Args:
+            file_path (str): Path of the new snapshot.
+            spans (Dict): The span of every object in it, by ID.
+            values (Dict): The indexed values of every object, by ID.
+        """
+        s_class = cls.__name__
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        cls._write_lazy_index(stat, spans, values)
+        with cls._lock().writing():
+            pending = LAZY.get(s_class, (None, {}))[1]
+            LAZY[s_class] = (mm, {obj_id: spans[obj_id]
+                                  for obj_id in pending if obj_id in spans})
 
     def save(self):
         """Save current object.
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with self.__class__._writer():
+            with self.__class__._lock().writing():
+                self._updated = int(time.time())
+                DATA[s_class][self.id] = self
+                self.__class__._forget_span(self.id)
+                self.__class__._index(self)
+                if STORAGE_MODE == 'journal':
+                    self.__class__._append({'op': 'save',
+                                            'obj': self.to_json(True)})
+                elif STORAGE_MODE == 'write_behind':
+                    _mark_dirty(self.__class__)
+            if STORAGE_MODE not in ('journal', 'write_behind'):
+                self.__class__.save_to_file()
 
     def remove(self):
         """Remove object from storage.
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        with self.__class__._writer():
+            with self.__class__._lock().writing():
+                stored = DATA[s_class].pop(self.id, None) is not None
+                if not (self.__class__._forget_span(self.id) or stored):
+                    return
+                self.__class__._unindex(self.id)
+                if STORAGE_MODE == 'journal':
+                    self.__class__._append({'op': 'remove',
+                                            'id': self.id})
+                elif STORAGE_MODE == 'write_behind':
+                    _mark_dirty(self.__class__)
+            if STORAGE_MODE not in ('journal', 'write_behind'):
+                self.__class__.save_to_file()
 
     @classmethod
     def count(cls) -> int:
@@ -136,13 +1110,18 @@ class Base():
             int: Number of objects.
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        with cls._lock().reading():
+            return len(DATA[s_class]) + len(LAZY.get(s_class,
+                                                     (None, ()))[1])
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
         """
         Retrieve all objects of this class.
 
+        As with `search`, objects decoded lazily are copies that are
+        not kept, and must be saved with `save()` once changed.
+
         Returns:
             Iterable[Base]: All objects.
         """
@@ -160,13 +1139,23 @@ class Base():
             Base: Object with the given ID, or None if not found.
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        with cls._lock().reading():
+            obj = DATA[s_class].get(id)
+        if obj is None and s_class in LAZY:
+            obj = cls._materialize(id)
+        return obj
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """
         Search all objects with matching attributes.
 
+        When an attribute of the query is indexed, only the objects
+        under that value are checked instead of every object. Objects
+        not loaded yet are decoded one at a time and not kept: changes
+        made to them are lost unless they are saved with `save()`, or
+        fetched again with `get` first.
+
         Args:
             attributes (dict): Attributes to match in the search.
 
@@ -183,4 +1172,20 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        with cls._lock().reading():
+            objs = DATA[s_class].values()
+            lazy_ids = list(LAZY.get(s_class, (None, ()))[1])
+            for k, v in attributes.items():
+                if k in cls.INDEXED_ATTRIBUTES:
+                    try:
+                        bucket = list(INDEXES[s_class][k].get(v, {}).items())
+                    except TypeError:
+                        continue
+                    objs = [obj for _, obj in bucket if obj is not None]
+                    lazy_ids = [obj_id for obj_id, obj in bucket
+                                if obj is None]
+                    break
+            if lazy_ids:
+                objs = chain(objs, filter(None, map(cls._decode_span,
+                                                    lazy_ids)))
+            return list(filter(_search, objs))
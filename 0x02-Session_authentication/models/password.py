@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Password hash module with self-describing, versioned hash strings.
+
+A hash is stored as `<algorithm>$<parameters>$<salt>$<digest>`, for
+example `pbkdf2_sha256$100000$<salt>$<digest>`, so the cost used for
+each password lives next to it and can be raised at any time. Bare
+64-character hex strings are the legacy unsalted SHA-256 format.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import re
+
+
+ALGORITHM = "pbkdf2_sha256"
+LEGACY_ALGORITHM = "sha256"
+WRAPPED_ALGORITHM = "pbkdf2_sha256_wrapped"
+ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', '100000'))
+SALT_BYTES = 16
+SEPARATOR = "$"
+LEGACY_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+def _b64(raw: bytes) -> str:
+    """Encode bytes as unpadded base64 text."""
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _pbkdf2(secret: str, salt: str, iterations: int) -> str:
+    """Derive the base64 PBKDF2-HMAC-SHA256 digest of a secret."""
+    return _b64(hashlib.pbkdf2_hmac("sha256", secret.encode(),
+                                    salt.encode(), iterations))
+
+
+def _legacy_digest(pwd: str) -> str:
+    """Return the legacy unsalted SHA-256 hex digest of a password."""
+    return hashlib.sha256(pwd.encode()).hexdigest().lower()
+
+
+def _encode(algorithm: str, secret: str, iterations: int = None) -> str:
+    """Hash a secret with a fresh salt into the versioned format."""
+    iterations = iterations or ITERATIONS
+    salt = _b64(os.urandom(SALT_BYTES))
+    return SEPARATOR.join((algorithm, str(iterations), salt,
+                           _pbkdf2(secret, salt, iterations)))
+
+
+def hash_password(pwd: str, iterations: int = None) -> str:
+    """
+    Hash a password with the current policy.
+
+    Args:
+        pwd (str): The password to hash.
+        iterations (int): PBKDF2 iterations, defaults to ITERATIONS.
+
+    Returns:
+        str: The versioned hash string.
+    """
+    return _encode(ALGORITHM, pwd, iterations)
+
+
+def wrap_legacy(hashed: str, iterations: int = None) -> str:
+    """
+    Strengthen a legacy SHA-256 hash without knowing the password.
+
+    The legacy hex digest is itself run through PBKDF2, so the stored
+    value no longer exposes an unsalted hash. It is replaced by a plain
+    current-policy hash the next time the user logs in.
+
+    Args:
+        hashed (str): The legacy hex digest.
+        iterations (int): PBKDF2 iterations, defaults to ITERATIONS.
+
+    Returns:
+        str: The wrapped, versioned hash string.
+    """
+    return _encode(WRAPPED_ALGORITHM, hashed, iterations)
+
+
+def identify(hashed: str) -> str:
+    """
+    Return the algorithm id of a stored hash.
+
+    Args:
+        hashed (str): The stored hash.
+
+    Returns:
+        str: The algorithm id, or None if the format is unknown.
+    """
+    if not isinstance(hashed, str):
+        return None
+    if LEGACY_HASH.fullmatch(hashed):
+        return LEGACY_ALGORITHM
+    algorithm = hashed.split(SEPARATOR, 1)[0]
+    if algorithm in (ALGORITHM, WRAPPED_ALGORITHM):
+        return algorithm
+    return None
+
+
+def verify_password(hashed: str, pwd: str) -> bool:
+    """
+    Check a password against a hash of any supported format.
+
+    Args:
+        hashed (str): The stored hash.
+        pwd (str): The password to check.
+
+    Returns:
+        bool: True if the password matches, False otherwise.
+    """
+    algorithm = identify(hashed)
+    if algorithm is None:
+        return False
+    if algorithm == LEGACY_ALGORITHM:
+        return hmac.compare_digest(_legacy_digest(pwd), hashed)
+    try:
+        _, iterations, salt, digest = hashed.split(SEPARATOR)
+        iterations = int(iterations)
+    except ValueError:
+        return False
+    secret = pwd if algorithm == ALGORITHM else _legacy_digest(pwd)
+    return hmac.compare_digest(_pbkdf2(secret, salt, iterations), digest)
+
+
+def needs_rehash(hashed: str) -> bool:
+    """
+    Check whether a hash falls short of the current policy.
+
+    Args:
+        hashed (str): The stored hash.
+
+    Returns:
+        bool: True if it should be replaced on the next login.
+    """
+    if identify(hashed) != ALGORITHM:
+        return True
+    return hashed.split(SEPARATOR)[1] != str(ITERATIONS)
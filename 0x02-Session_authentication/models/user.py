@@ -2,8 +2,14 @@
 """
 User module for managing user-related operations and data.
 """
-import hashlib
+import threading
+from typing import Callable
+
 from models.base import Base
+from models.password import (
+    hash_password, needs_rehash, verify_password, wrap_legacy,
+    identify, LEGACY_ALGORITHM
+)
 
 
 class User(Base):
@@ -11,6 +17,9 @@ class User(Base):
     User class for representing and managing user entities.
     """
 
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+    INDEXED_ATTRIBUTES = ('email',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a User instance with provided attributes.
@@ -37,24 +46,23 @@ class User(Base):
     @password.setter
     def password(self, pwd: str):
         """
-        Set a new password, encrypting it using SHA256.
+        Set a new password, hashing it with the current policy.
 
         Args:
             pwd (str): The password to be set.
-
-        Note:
-           Use a more secure password hashing algorithm like argon2
-           or bcrypt in real-world projects.
         """
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
-            self._password = hashlib.sha256(pwd.encode()).hexdigest().lower()
+            self._password = hash_password(pwd)
 
     def is_valid_password(self, pwd: str) -> bool:
         """
         Validate if the provided password matches the user's password.
 
+        Any supported hash format is accepted. On a match, a hash that
+        falls short of the current policy is replaced and saved.
+
         Args:
             pwd (str): The password to validate.
 
@@ -65,8 +73,12 @@ class User(Base):
             return False
         if self.password is None:
             return False
-        pwd_e = pwd.encode()
-        return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
+        if not verify_password(self.password, pwd):
+            return False
+        if needs_rehash(self.password):
+            self._password = hash_password(pwd)
+            self.save()
+        return True
 
     def display_name(self) -> str:
         """
@@ -86,3 +98,56 @@ class User(Base):
             return "{}".format(self.last_name)
         else:
             return "{} {}".format(self.first_name, self.last_name)
+
+
+def migrate_passwords(progress: Callable[[int, int], None] = None,
+                      batch_size: int = 100) -> int:
+    """
+    Wrap every legacy SHA-256 password hash into the versioned format.
+
+    Each batch is hashed and saved while holding the store for writing,
+    after catching up with other processes, so that their changes are
+    kept. Users are fetched again with `User.get` within it, which also
+    keeps lazily loaded ones in memory until saved. `progress(done,
+    total)` is called after each batch. Wrapped hashes are upgraded to a
+    plain current-policy hash on the user's next login.
+
+    Args:
+        progress (Callable[[int, int], None]): Progress callback.
+        batch_size (int): Number of users hashed between saves.
+
+    Returns:
+        int: The number of migrated users.
+    """
+    user_ids = [user.id for user in User.all()
+                if identify(user.password) == LEGACY_ALGORITHM]
+    total = len(user_ids)
+    for start in range(0, total, batch_size):
+        with User._writer():
+            for user_id in user_ids[start:start + batch_size]:
+                user = User.get(user_id)
+                if user is not None and \
+                        identify(user.password) == LEGACY_ALGORITHM:
+                    user._password = wrap_legacy(user.password)
+            User.save_to_file()
+        if progress is not None:
+            progress(min(start + batch_size, total), total)
+    return total
+
+
+def start_password_migration(progress: Callable[[int, int], None] = None,
+                             batch_size: int = 100) -> threading.Thread:
+    """
+    Run `migrate_passwords` in a background daemon thread.
+
+    Args:
+        progress (Callable[[int, int], None]): Progress callback.
+        batch_size (int): Number of users hashed between saves.
+
+    Returns:
+        threading.Thread: The started thread.
+    """
+    thread = threading.Thread(target=migrate_passwords,
+                              args=(progress, batch_size), daemon=True)
+    thread.start()
+    return thread
@@ -1,19 +1,28 @@
 #!/usr/bin/env python3
 """User session module for managing user session data."""
 
+import sys
+
 from models.base import Base
 
 
 class UserSession(Base):
     """User session class for representing and managing user sessions."""
 
+    __slots__ = ('user_id', 'session_id')
+    INDEXED_ATTRIBUTES = ('session_id',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a UserSession instance.
 
+        The user ID is interned, as every session of a user repeats it.
+
         Args:
             *args: Variable length argument list.
             **kwargs: Arbitrary keyword arguments.
         """
         super().__init__(*args, **kwargs)
-        self.user_id = kwargs.get('user_id')
+        user_id = kwargs.get('user_id')
+        self.user_id = sys.intern(user_id) \
+            if type(user_id) is str else user_id
         self.session_id = kwargs.get('session_id')
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Stress test of the object store under concurrent threads.
+
+Worker threads create, search, get and remove sessions while another
+thread flushes the store to disk. The store is then checked for lost
+or stale index entries and reloaded from disk to compare.
+
+Usage: python3 stress_store.py [--threads N] [--seconds S]
+                               [--storage-mode MODE] [--load-mode MODE]
+                               [--snapshot-format FORMAT]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Sequence
+
+from models import base
+from models.user_session import UserSession
+
+
+def worker(stop: threading.Event, seed: int, stats: Dict[str, int],
+           errors: List[str]) -> None:
+    """
+    Run random store operations until `stop` is set.
+
+    Args:
+        stop (threading.Event): Set when the test is over.
+        seed (int): Seed of the random generator.
+        stats (Dict[str, int]): Operation counts, updated in place.
+        errors (List[str]): Failures, appended in place.
+    """
+    rng = random.Random(seed)
+    mine = []
+    ops = 0
+    try:
+        while not stop.is_set():
+            action = rng.random()
+            if action < 0.3 or not mine:
+                session = UserSession(user_id="user-{}".format(
+                    rng.randrange(100)), session_id=str(uuid.uuid4()))
+                session.save()
+                mine.append(session)
+            elif action < 0.6:
+                session = rng.choice(mine)
+                found = UserSession.search(
+                    {'session_id': session.session_id})
+                if [obj.id for obj in found] != [session.id]:
+                    errors.append("search lost {}".format(session.id))
+            elif action < 0.7:
+                UserSession.search({'user_id': rng.choice(mine).user_id})
+            elif action < 0.8:
+                session = rng.choice(mine)
+                if UserSession.get(session.id) is None:
+                    errors.append("get lost {}".format(session.id))
+            elif action < 0.85:
+                UserSession.count()
+            else:
+                session = mine.pop(rng.randrange(len(mine)))
+                session.remove()
+                if UserSession.search({'session_id': session.session_id}):
+                    errors.append("remove left {}".format(session.id))
+            ops += 1
+    except Exception as e:
+        errors.append("{}: {}".format(type(e).__name__, e))
+    stats[threading.current_thread().name] = ops
+
+
+def flusher(stop: threading.Event, errors: List[str]) -> None:
+    """
+    Write the store to disk in a loop until `stop` is set.
+
+    Args:
+        stop (threading.Event): Set when the test is over.
+        errors (List[str]): Failures, appended in place.
+    """
+    try:
+        while not stop.wait(0.05):
+            UserSession.save_to_file()
+    except Exception as e:
+        errors.append("flush {}: {}".format(type(e).__name__, e))
+
+
+def check_store() -> List[str]:
+    """
+    Check the indexes against DATA, then a reload against memory.
+
+    Returns:
+        List[str]: One description per inconsistency.
+    """
+    errors = []
+    data = base.DATA['UserSession']
+    lazy = base.LAZY.get('UserSession', (None, {}))[1]
+    index = base.INDEXES['UserSession']['session_id']
+    for obj in data.values():
+        if index.get(obj.session_id, {}).get(obj.id) is not obj:
+            errors.append("not indexed: {}".format(obj.id))
+    indexed = {obj_id for bucket in index.values() for obj_id in bucket}
+    if indexed != set(data) | set(lazy):
+        errors.append("{} stale index entries".format(
+            len(indexed - set(data) - set(lazy))))
+    if UserSession.count() != len(data) + len(lazy):
+        errors.append("count does not match the objects")
+
+    base.flush()
+    UserSession.save_to_file()
+    before = {obj.id: obj.to_json(True) for obj in UserSession.all()}
+    UserSession.load_from_file()
+    after = {obj.id: obj.to_json(True) for obj in UserSession.all()}
+    differ = [obj_id for obj_id in set(before) | set(after)
+              if before.get(obj_id) != after.get(obj_id)]
+    if differ:
+        errors.append("reload differs on {} objects".format(len(differ)))
+    return errors
+
+
+def main(argv: Sequence[str] = None) -> None:
+    """
+    Run the stress test, print a summary and exit 1 on failure.
+
+    Args:
+        argv (Sequence[str]): Arguments to parse, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        prog="stress_store", description="Stress the object store.")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="worker threads")
+    parser.add_argument("--seconds", type=float, default=5.0,
+                        help="duration of the test")
+    parser.add_argument("--storage-mode", default=base.STORAGE_MODE,
+                        choices=("file", "journal", "write_behind"))
+    parser.add_argument("--load-mode", default=base.LOAD_MODE,
+                        choices=("eager", "lazy"))
+    parser.add_argument("--snapshot-format", default=base.SNAPSHOT_FORMAT,
+                        choices=("json", "binary"))
+    args = parser.parse_args(argv)
+    base.STORAGE_MODE = args.storage_mode
+    base.LOAD_MODE = args.load_mode
+    base.SNAPSHOT_FORMAT = args.snapshot_format
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            UserSession.load_from_file()
+            stop = threading.Event()
+            stats = {}
+            errors = []
+            threads = [threading.Thread(target=worker,
+                                        args=(stop, i, stats, errors))
+                       for i in range(args.threads)]
+            threads.append(threading.Thread(target=flusher,
+                                            args=(stop, errors)))
+            for thread in threads:
+                thread.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            errors.extend(check_store())
+            sessions = UserSession.count()
+            base.LAZY.clear()
+        finally:
+            os.chdir(cwd)
+
+    ops = sum(stats.values())
+    print("{} operations in {:g}s ({:.0f} ops/s), {} sessions".format(
+        ops, args.seconds, ops / args.seconds, sessions))
+    for error in errors[:20]:
+        print("error: " + error, file=sys.stderr)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
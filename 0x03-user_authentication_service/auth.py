@@ -6,6 +6,7 @@ from uuid import uuid4
 from typing import Union
 from sqlalchemy.orm.exc import NoResultFound
 
+from bcrypt_cost import get_cost
 from db import DB
 from user import User
 
@@ -13,13 +14,17 @@ from user import User
 def _hash_password(password: str) -> bytes:
     """Hash a password using bcrypt.
 
+    The cost factor comes from `bcrypt_cost.get_cost`, so it follows
+    the calibrated setting instead of the library default.
+
     Args:
         password (str): The password to hash.
 
     Returns:
         bytes: The hashed password.
     """
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode("utf-8"),
+                         bcrypt.gensalt(rounds=get_cost()))
 
 
 def _generate_uuid() -> str: